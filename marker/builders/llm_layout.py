@@ -41,6 +41,10 @@ class LLMLayoutBuilder(LayoutBuilder):
         int,
         "The maximum number of concurrent requests to make to the Gemini model.",
     ] = 3
+    rate_limited_max_concurrency: Annotated[
+        int,
+        "The maximum number of concurrent requests to make when the LLM service limits its own requests per minute, in place of max_concurrency.",
+    ] = 8
     disable_tqdm: Annotated[
         bool,
         "Whether to disable the tqdm progress bar.",
@@ -94,6 +98,12 @@ Respond only with one of `Figure`, `Picture`, `ComplexRegion`, `Table`, or `Form
 
         self.llm_service = llm_service
 
+    def get_max_concurrency(self) -> int:
+        # The service's limiter keeps a wider fan-out under quota, so more requests can wait on the network at once
+        if self.llm_service.is_rate_limited():
+            return self.rate_limited_max_concurrency
+        return self.max_concurrency
+
     def __call__(self, document: Document, provider: PdfProvider):
         super().__call__(document, provider)
         try:
@@ -102,8 +112,7 @@ Respond only with one of `Figure`, `Picture`, `ComplexRegion`, `Table`, or `Form
             print(f"Error relabelling blocks: {e}")
 
     def relabel_blocks(self, document: Document):
-        pbar = tqdm(desc="LLM layout relabelling", disable=self.disable_tqdm)
-        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+        with ThreadPoolExecutor(max_workers=self.get_max_concurrency()) as executor:
             futures = []
             for page in document.pages:
                 for block_id in page.structure:
@@ -117,11 +126,8 @@ Respond only with one of `Figure`, `Picture`, `ComplexRegion`, `Table`, or `Form
                         elif block.block_type in (BlockTypes.Picture, BlockTypes.Figure, BlockTypes.SectionHeader) and block.polygon.height > page.polygon.height * self.picture_height_threshold:
                             futures.append(executor.submit(self.process_block_complex_relabeling, document, page, block))
 
-            for future in as_completed(futures):
+            for future in tqdm(as_completed(futures), total=len(futures), desc="LLM layout relabelling", disable=self.disable_tqdm):
                 future.result()  # Raise exceptions if any occurred
-                pbar.update(1)
-
-        pbar.close()
 
     def process_block_topk_relabeling(self, document: Document, page: PageGroup, block: Block):
         topk_types = list(block.top_k.keys())
@@ -4,6 +4,7 @@ from typing import Annotated, TypedDict, List, Sequence
 
 from pydantic import BaseModel
 from tqdm import tqdm
+from typing_extensions import NotRequired
 from PIL import Image
 
 from marker.processors import BaseProcessor
@@ -23,6 +24,7 @@ class PromptData(TypedDict):
     schema: BaseModel
     page: PageGroup
     additional_data: dict | None
+    system_prompt: NotRequired[str | None]
 
 
 class BlockData(TypedDict):
@@ -46,6 +48,10 @@ class BaseLLMProcessor(BaseProcessor):
         int,
         "The maximum number of concurrent requests to make to the Gemini model.",
     ] = 3
+    rate_limited_max_concurrency: Annotated[
+        int,
+        "The maximum number of concurrent requests to make when the LLM service limits its own requests per minute, in place of max_concurrency.",
+    ] = 8
     image_expansion_ratio: Annotated[
         float,
         "The ratio to expand the image by when cropping.",
@@ -69,12 +75,19 @@ class BaseLLMProcessor(BaseProcessor):
 
         self.llm_service = llm_service
 
-    def extract_image(self, document: Document, image_block: Block, remove_blocks: Sequence[BlockTypes] | None = None) -> Image.Image:
+    def get_max_concurrency(self) -> int:
+        # The service's limiter keeps a wider fan-out under quota, so more requests can wait on the network at once
+        if self.llm_service.is_rate_limited():
+            return self.rate_limited_max_concurrency
+        return self.max_concurrency
+
+    def extract_image(self, document: Document, image_block: Block, remove_blocks: Sequence[BlockTypes] | None = None, page_image: Image.Image | None = None) -> Image.Image:
         return image_block.get_image(
             document,
             highres=True,
             expansion=(self.image_expansion_ratio, self.image_expansion_ratio),
-            remove_blocks=remove_blocks
+            remove_blocks=remove_blocks,
+            page_image=page_image
         )
 
 
@@ -95,22 +108,25 @@ class BaseLLMComplexBlockProcessor(BaseLLMProcessor):
         raise NotImplementedError()
 
     def rewrite_blocks(self, document: Document):
+        # Walk the pages once, and reuse the blocks for both the count and the submissions
+        page_blocks = [
+            (page, block)
+            for page in document.pages
+            for block in page.contained_blocks(document, self.block_types)
+        ]
+
         # Don't show progress if there are no blocks to process
-        total_blocks = sum(len(page.contained_blocks(document, self.block_types)) for page in document.pages)
-        if total_blocks == 0:
+        if len(page_blocks) == 0:
             return
 
-        pbar = tqdm(desc=f"{self.__class__.__name__} running", disable=self.disable_tqdm)
-        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
-            for future in as_completed([
+        with ThreadPoolExecutor(max_workers=self.get_max_concurrency()) as executor:
+            futures = [
                 executor.submit(self.process_rewriting, document, page, block)
-                for page in document.pages
-                for block in page.contained_blocks(document, self.block_types)
-            ]):
+                for page, block in page_blocks
+            ]
+            # Let tqdm drive the iteration, so it can skip redraws between its refresh intervals
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"{self.__class__.__name__} running", disable=self.disable_tqdm):
                 future.result()  # Raise exceptions if any occurred
-                pbar.update(1)
-
-        pbar.close()
 
 
 class BaseLLMSimpleBlockProcessor(BaseLLMProcessor):
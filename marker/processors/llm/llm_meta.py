@@ -1,9 +1,9 @@
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Annotated
 
 from tqdm import tqdm
 
-from marker.processors.llm import BaseLLMSimpleBlockProcessor, BaseLLMProcessor
+from marker.processors.llm import BaseLLMSimpleBlockProcessor, BaseLLMProcessor, PromptData
 from marker.schema.document import Document
 from marker.services import BaseService
 
@@ -12,6 +12,11 @@ class LLMSimpleBlockMetaProcessor(BaseLLMProcessor):
     """
     A wrapper for simple LLM processors, so they can all run in parallel.
     """
+    batch_mode: Annotated[
+        bool,
+        "Whether to submit all LLM requests as a single batch job.  Cheaper, but can be much slower.  Only some services support this natively.",
+    ] = False
+
     def __init__(self, processor_lst: List[BaseLLMSimpleBlockProcessor], llm_service: BaseService, config=None):
         super().__init__(llm_service, config)
         self.processors = processor_lst
@@ -20,14 +25,25 @@ class LLMSimpleBlockMetaProcessor(BaseLLMProcessor):
         if not self.use_llm or self.llm_service is None:
             return
 
-        total = sum([len(processor.inference_blocks(document)) for processor in self.processors])
-        pbar = tqdm(desc=f"LLM processors running", disable=self.disable_tqdm, total=total)
+        # The total grows as prompts are built, instead of finding every processor's blocks twice
+        pbar = tqdm(desc=f"LLM processors running", disable=self.disable_tqdm, total=0)
+
+        if self.batch_mode:
+            all_prompts = [processor.block_prompts(document) for processor in self.processors]
+            pbar.total = sum(len(prompt_lst) for prompt_lst in all_prompts)
+            pbar.refresh()
+            self.process_batch(all_prompts, document, pbar)
+            pbar.close()
+            return
 
-        all_prompts = [processor.block_prompts(document) for processor in self.processors]
         pending = []
         futures_map = {}
-        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
-            for i, prompt_lst in enumerate(all_prompts):
+        with ThreadPoolExecutor(max_workers=self.get_max_concurrency()) as executor:
+            # Submit each processor's requests as soon as its images are cropped, so cropping overlaps with inference
+            for i, processor in enumerate(self.processors):
+                prompt_lst = processor.block_prompts(document)
+                pbar.total += len(prompt_lst)
+                pbar.refresh()
                 for prompt in prompt_lst:
                     future = executor.submit(self.get_response, prompt)
                     pending.append(future)
@@ -50,5 +66,27 @@ class LLMSimpleBlockMetaProcessor(BaseLLMProcessor):
 
         pbar.close()
 
+    def process_batch(self, all_prompts: List[List[PromptData]], document: Document, pbar: tqdm):
+        prompt_lst = [(i, prompt) for i, processor_prompts in enumerate(all_prompts) for prompt in processor_prompts]
+        results = self.llm_service.batch([self.get_request(prompt) for _, prompt in prompt_lst], self.get_max_concurrency())
+
+        for (processor_idx, prompt_data), result in zip(prompt_lst, results):
+            try:
+                processor: BaseLLMSimpleBlockProcessor = self.processors[processor_idx]
+                processor(result, prompt_data, document)
+            except Exception as e:
+                print(f"Error processing LLM response: {e}")
+
+            pbar.update(1)
+
+    def get_request(self, prompt_data: Dict[str, Any]):
+        return {
+            "prompt": prompt_data["prompt"],
+            "image": prompt_data["image"],
+            "block": prompt_data["block"],
+            "response_schema": prompt_data["schema"],
+            "system_prompt": prompt_data.get("system_prompt"),
+        }
+
     def get_response(self, prompt_data: Dict[str, Any]):
-        return self.llm_service(prompt_data["prompt"], prompt_data["image"], prompt_data["block"], prompt_data["schema"])
+        return self.llm_service(**self.get_request(prompt_data))
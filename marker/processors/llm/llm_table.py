@@ -1,6 +1,6 @@
 from typing import Annotated, List, Tuple
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from PIL import Image
 from pydantic import BaseModel
 
@@ -169,17 +169,19 @@ No corrections needed.
         return element.decode_contents()
 
     def parse_html_table(self, html_text: str, block: Block, page: PageGroup) -> List[TableCell]:
-        soup = BeautifulSoup(html_text, 'html.parser')
+        # Only build the table, and skip any commentary the LLM wrote around it
+        soup = BeautifulSoup(html_text, 'html.parser', parse_only=SoupStrainer('table'))
         table = soup.find('table')
 
         # Initialize grid
         rows = table.find_all('tr')
+        # Search each row once, since the cells are needed for both passes
+        rows_cells = [row.find_all(['td', 'th']) for row in rows]
         cells = []
 
         # Find maximum number of columns in colspan-aware way
         max_cols = 0
-        for row in rows:
-            row_tds = row.find_all(['td', 'th'])
+        for row_tds in rows_cells:
             curr_cols = 0
             for cell in row_tds:
                 colspan = int(cell.get('colspan', 1))
@@ -189,10 +191,13 @@ No corrections needed.
 
         grid = [[True] * max_cols for _ in range(len(rows))]
 
-        for i, row in enumerate(rows):
+        for i, row_cells in enumerate(rows_cells):
             cur_col = 0
-            row_cells = row.find_all(['td', 'th'])
             for j, cell in enumerate(row_cells):
+                # Cells of nested tables are unwrapped while reading the outer cell text
+                if cell.parent is None:
+                    continue
+
                 while cur_col < max_cols and not grid[i][cur_col]:
                     cur_col += 1
 
@@ -147,7 +147,6 @@ Table 2
         return max_cols
 
     def rewrite_blocks(self, document: Document):
-        pbar = tqdm(desc=f"{self.__class__.__name__} running", disable=self.disable_tqdm)
         table_runs = []
         table_run = []
         prev_block = None
@@ -209,15 +208,13 @@ Table 2
         if table_run:
             table_runs.append(table_run)
 
-        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
-            for future in as_completed([
+        with ThreadPoolExecutor(max_workers=self.get_max_concurrency()) as executor:
+            futures = [
                 executor.submit(self.process_rewriting, document, blocks)
                 for blocks in table_runs
-            ]):
+            ]
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"{self.__class__.__name__} running", disable=self.disable_tqdm):
                 future.result()  # Raise exceptions if any occurred
-                pbar.update(1)
-
-        pbar.close()
 
     def process_rewriting(self, document: Document, blocks: List[Block]):
         if len(blocks) < 2:
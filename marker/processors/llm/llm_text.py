@@ -13,11 +13,27 @@ from marker.schema.document import Document
 from marker.schema.text import Line
 
 
+class TextBlockData(BlockData):
+    text: str
+
+
 class LLMTextProcessor(BaseLLMSimpleBlockProcessor):
     math_line_batch_size: Annotated[
         int,
         "The number of math lines to batch together.",
     ] = 10
+    math_line_batch_max_chars: Annotated[
+        int,
+        "The maximum number of characters of extracted text to batch together.  Long lines get smaller batches.",
+    ] = 6000
+    min_math_line_chars: Annotated[
+        int,
+        "Math lines with less text than this, and none of the math hint characters, are skipped.",
+    ] = 8
+    math_hint_chars: Annotated[
+        str,
+        "Characters that indicate a short line contains math worth correcting.",
+    ] = "=+-^_\\$∫∑√"
 
     block_types = (BlockTypes.Line,)
     image_remove_blocks = (BlockTypes.Equation,)
@@ -37,7 +53,7 @@ The number of output lines MUST match the number of input lines.  Stay as faithf
     * Formatting: Maintain consistent formatting with the text block image, including spacing, indentation, and special characters.
     * Other inaccuracies:  If the image is handwritten then you may correct any spelling errors, or other discrepancies.
 5. Do not remove any formatting i.e bold, italics, math, superscripts, subscripts, etc from the extracted lines unless it is necessary to correct an error.  The formatting 
-6. The number of corrected lines in the output MUST equal the number of extracted lines provided in the input. Do not add or remove lines.  There are exactly {line_count} input lines.
+6. The number of corrected lines in the output MUST equal the number of extracted lines provided in the input. Do not add or remove lines.
 7. Output the corrected lines in JSON format with a "lines" field, as shown in the example below.  Each line should be in HTML format. Only use the math, br, a, i, b, sup, sub, and span tags.
 8. You absolutely cannot remove any <a href='#...'>...</a> tags, those are extremely important for references and are coming directly from the document, you MUST always preserve them.
 
@@ -71,6 +87,8 @@ Output:
  ]
 }
 ```
+"""
+    text_math_input_prompt = r"""There are exactly {line_count} input lines.
 
 **Input:**
 ```json
@@ -78,19 +96,41 @@ Output:
 ```
 """
 
-    def inference_blocks(self, document: Document) -> List[List[BlockData]]:
+    def inference_blocks(self, document: Document) -> List[List[TextBlockData]]:
         blocks = []
         for page in document.pages:
             for block in page.contained_blocks(document, self.block_types):
-                if block.formats and "math" in block.formats:
+                if block.formats and "math" in block.formats and not self.skip_math_line(block, document):
                     blocks.append({
                         "page": page,
-                        "block": block
+                        "block": block,
+                        # Formatting walks every span, so do it once for both batching and the prompt
+                        "text": block.formatted_text(document)
                     })
 
+        return self.batch_blocks(blocks)
+
+    def skip_math_line(self, block: Block, document: Document) -> bool:
+        # Very short lines with no math symbols rarely change, and aren't worth a request
+        text = block.raw_text(document).strip()
+        return len(text) < self.min_math_line_chars and not any(c in self.math_hint_chars for c in text)
+
+    def batch_blocks(self, blocks: List[TextBlockData]) -> List[List[TextBlockData]]:
+        # Greedily fill each batch up to the line and character limits, so short lines share a request
         out_blocks = []
-        for i in range(0, len(blocks), self.math_line_batch_size):
-            batch = blocks[i:i + self.math_line_batch_size]
+        batch = []
+        batch_chars = 0
+        for block_data in blocks:
+            block_chars = len(block_data["text"])
+            if batch and (len(batch) >= self.math_line_batch_size or batch_chars + block_chars > self.math_line_batch_max_chars):
+                out_blocks.append(batch)
+                batch = []
+                batch_chars = 0
+
+            batch.append(block_data)
+            batch_chars += block_chars
+
+        if batch:
             out_blocks.append(batch)
         return out_blocks
 
@@ -115,21 +155,30 @@ Output:
 
     def block_prompts(self, document: Document) -> List[PromptData]:
         prompt_data = []
+        # Lines come in page order, so only the current page image needs to be kept
+        page_image_id = None
+        page_image = None
         for block_data in self.inference_blocks(document):
             blocks: List[Line] = [b["block"] for b in block_data]
             pages = [b["page"] for b in block_data]
-            block_lines = [block.formatted_text(document) for block in blocks]
+            block_lines = [b["text"] for b in block_data]
 
             prompt = (
-                self.text_math_rewriting_prompt
-                  .replace("{extracted_lines}",json.dumps({"extracted_lines": block_lines}, indent=2))
+                self.text_math_input_prompt
                   .replace("{line_count}", str(len(block_lines)))
+                  .replace("{extracted_lines}", json.dumps({"extracted_lines": block_lines}))
             )
-            images = [self.extract_image(document, block, remove_blocks=self.image_remove_blocks) for block in blocks]
+            images = []
+            for block, page in zip(blocks, pages):
+                if page.page_id != page_image_id:
+                    page_image_id = page.page_id
+                    page_image = page.get_image(highres=True, remove_blocks=self.image_remove_blocks)
+                images.append(self.extract_image(document, block, page_image=page_image))
             image = self.combine_images(images)
 
             prompt_data.append({
                 "prompt": prompt,
+                "system_prompt": self.text_math_rewriting_prompt,
                 "image": image,
                 "block": blocks[0],
                 "schema": LLMTextSchema,
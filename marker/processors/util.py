@@ -1,6 +1,5 @@
 import re
-
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 
 from marker.schema import BlockTypes
 from marker.schema.groups import PageGroup
@@ -19,59 +18,154 @@ def escape_latex_commands(text: str):
 def add_math_spans_to_line(corrected_text: str, text_line: Line, page: PageGroup):
     SpanClass = get_block_class(BlockTypes.Span)
     corrected_spans = text_to_spans(corrected_text)
+    if corrected_spans:
+        corrected_spans[-1]['content'] += "\n"
 
-    for span_idx, span in enumerate(corrected_spans):
-        if span_idx == len(corrected_spans) - 1:
-            span['content'] += "\n"
-
-        span_block = page.add_full_block(
-            SpanClass(
-                polygon=text_line.polygon,
-                text=span['content'],
-                font='Unknown',
-                font_weight=0,
-                font_size=0,
-                minimum_position=0,
-                maximum_position=0,
-                formats=[span['type']],
-                url=span.get('url'),
-                page_id=text_line.page_id,
-                text_extraction_method="gemini",
-            )
+    polygon = text_line.polygon
+    page_id = text_line.page_id
+    span_blocks = page.add_full_blocks([
+        SpanClass(
+            polygon=polygon,
+            text=span['content'],
+            font='Unknown',
+            font_weight=0,
+            font_size=0,
+            minimum_position=0,
+            maximum_position=0,
+            formats=[span['type']],
+            url=span.get('url'),
+            page_id=page_id,
+            text_extraction_method="gemini",
         )
-        text_line.structure.append(span_block.id)
-
+        for span in corrected_spans
+    ])
+    text_line.structure.extend([span_block.id for span_block in span_blocks])
 
-def text_to_spans(text):
-    soup = BeautifulSoup(text, 'html.parser')
 
+class SpanParser(HTMLParser):
+    """
+    Converts LLM html output into spans in a single pass, without building a tree.
+    Only top-level elements become spans, and strings are split and collapsed the same way BeautifulSoup does.
+    """
     tag_types = {
         'b': 'bold',
         'i': 'italic',
         'math': 'math',
     }
-    spans = []
+    void_tags = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+    preserve_whitespace_tags = {'pre', 'textarea'}
+    ascii_spaces = '\x20\x0a\x09\x0c\x0d'
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.spans = []
+        # Open elements.  string mirrors a tree node's .string, and is only set when the element has a single child string
+        self.stack = []
+        # All text inside the current top-level element
+        self.text_parts = []
+        self.pending_text = []
+        # Void tags that were closed on open, so a matching end tag is skipped
+        self.closed_void_tags = []
+
+    def handle_starttag(self, tag, attrs):
+        self.flush_text()
+        self.stack.append({
+            'name': tag,
+            'attrs': dict(attrs),
+            'children': 0,
+            'string': None,
+        })
+        if tag in self.void_tags:
+            self.closed_void_tags.append(tag)
+            self.close_element()
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_void_tags:
+            self.closed_void_tags.remove(tag)
+            return
+
+        self.flush_text()
+        # Close everything up to the matching open tag, and ignore stray end tags
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i]['name'] == tag:
+                while len(self.stack) > i:
+                    self.close_element()
+                return
+
+    def handle_data(self, data):
+        self.pending_text.append(data)
+
+    def handle_comment(self, data):
+        self.flush_text()
+        self.add_string(data, is_text=False)
+
+    def flush_text(self):
+        if not self.pending_text:
+            return
+
+        text = "".join(self.pending_text)
+        self.pending_text = []
+        if not text:
+            return
 
-    for element in soup.descendants:
-        if not len(list(element.parents)) == 1:
-            continue
+        # Whitespace-only strings collapse to a single newline or space
+        preserve_whitespace = any(element['name'] in self.preserve_whitespace_tags for element in self.stack)
+        if not preserve_whitespace and not text.strip(self.ascii_spaces):
+            text = "\n" if "\n" in text else " "
 
-        url = element.attrs.get('href') if hasattr(element, 'attrs') else None
+        self.add_string(text, is_text=True)
 
-        if element.name in tag_types:
-            text = element.get_text()
-            if element.name == "math":
+    def add_string(self, text, is_text):
+        if not self.stack:
+            self.spans.append({
+                'type': 'plain',
+                'content': text,
+                'url': None
+            })
+            return
+
+        if is_text:
+            self.text_parts.append(text)
+        self.add_child(text)
+
+    def add_child(self, string):
+        parent = self.stack[-1]
+        parent['children'] += 1
+        parent['string'] = string if parent['children'] == 1 else None
+
+    def close_element(self):
+        element = self.stack.pop()
+        if self.stack:
+            self.add_child(element['string'])
+            return
+
+        url = element['attrs'].get('href')
+        if element['name'] in self.tag_types:
+            text = "".join(self.text_parts)
+            if element['name'] == "math":
                 text = escape_latex_commands(text)
-            spans.append({
-                'type': tag_types[element.name],
+            self.spans.append({
+                'type': self.tag_types[element['name']],
                 'content': text,
                 'url': url
             })
-        elif element.string:
-            spans.append({
+        elif element['string']:
+            self.spans.append({
                 'type': 'plain',
-                'content': element.string,
+                'content': element['string'],
                 'url': url
             })
+        self.text_parts = []
+
+    def close(self):
+        super().close()
+        self.flush_text()
+        while self.stack:
+            self.close_element()
 
-    return spans
\ No newline at end of file
+
+def text_to_spans(text):
+    parser = SpanParser()
+    parser.feed(text)
+    parser.close()
+    return parser.spans
@@ -102,11 +102,13 @@ class Block(BaseModel):
         block_attrs = block.model_dump(exclude=["id", "block_id", "block_type"])
         return cls(**block_attrs)
 
-    def get_image(self, document: Document, highres: bool = False, expansion: Tuple[float, float] | None = None, remove_blocks: Sequence[BlockTypes] | None = None) -> Image.Image | None:
+    def get_image(self, document: Document, highres: bool = False, expansion: Tuple[float, float] | None = None, remove_blocks: Sequence[BlockTypes] | None = None, page_image: Image.Image | None = None) -> Image.Image | None:
         image = self.highres_image if highres else self.lowres_image
         if image is None:
             page = document.get_page(self.page_id)
-            page_image = page.get_image(highres=highres, remove_blocks=remove_blocks)
+            # Callers cropping many blocks from one page can pass the page image in, to avoid recreating it for every block
+            if page_image is None:
+                page_image = page.get_image(highres=highres, remove_blocks=remove_blocks)
 
             # Scale to the image size
             bbox = self.polygon.rescale((page.polygon.width, page.polygon.height), page_image.size)
@@ -188,13 +190,11 @@ class Block(BaseModel):
         if self.ignore_for_output:
             return ""
 
-        template = ""
-        for c in child_blocks:
-            template += f"<content-ref src='{c.id}'></content-ref>"
+        template = "".join([f"<content-ref src='{c.id}'></content-ref>" for c in child_blocks])
 
         if self.replace_output_newlines:
             template = template.replace("\n", " ")
-            template = "<p>" + template + "</p>"
+            template = f"<p>{template}</p>"
 
         return template
 
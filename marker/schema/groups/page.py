@@ -97,6 +97,21 @@ class PageGroup(Group):
         self.add_child(block)
         return block
 
+    def add_full_blocks(self, blocks: List[Block]) -> List[Block]:
+        # Assign all the ids at once, instead of incrementing and appending block by block
+        if not blocks:
+            return blocks
+
+        start_id = 0 if self.block_id is None else self.block_id + 1
+        for i, block in enumerate(blocks):
+            block.block_id = start_id + i
+        self.block_id = start_id + len(blocks) - 1
+
+        if self.children is None:
+            self.children = []
+        self.children.extend(blocks)
+        return blocks
+
     def get_block(self, block_id: BlockId) -> Block | None:
         block: Block = self.children[block_id.block_id]
         assert block.block_id == block_id.block_id
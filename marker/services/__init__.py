@@ -1,9 +1,14 @@
-from typing import Optional, List, Annotated
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Annotated, Dict, Any
 
 import PIL
 from pydantic import BaseModel
 
 from marker.schema.blocks import Block
+from marker.services.cache import ResponseCache
+from marker.settings import settings
 from marker.util import assign_config, verify_config_keys
 
 
@@ -16,6 +21,10 @@ class BaseService:
         int,
         "The maximum number of retries to use for the service."
     ] = 1
+    cache_responses: Annotated[
+        bool,
+        "Whether to cache LLM responses on disk, keyed on the model, prompt, and images, so repeat runs skip the request.  The cache is stored in settings.CACHE_DIR, and is never evicted."
+    ] = False
 
     def __init__(self, config: Optional[BaseModel | dict] = None):
         assign_config(self, config)
@@ -23,6 +32,13 @@ class BaseService:
         # Ensure we have all necessary fields filled out (API keys, etc.)
         verify_config_keys(self)
 
+        self.response_cache = None
+        if self.cache_responses:
+            try:
+                self.response_cache = ResponseCache(os.path.join(settings.CACHE_DIR, "llm_responses.db"))
+            except (OSError, sqlite3.Error) as e:
+                print(f"Could not open the response cache, continuing without it: {e}")
+
     def __call__(
         self,
         prompt: str,
@@ -30,6 +46,31 @@ class BaseService:
         block: Block,
         response_schema: type[BaseModel],
         max_retries: int | None = None,
-        timeout: int | None = None
+        timeout: int | None = None,
+        system_prompt: str | None = None
      ):
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def response_cache_key(
+        self,
+        model_name: str,
+        prompt: str,
+        image: PIL.Image.Image | List[PIL.Image.Image],
+        response_schema: type[BaseModel],
+        system_prompt: str | None = None
+    ) -> str | None:
+        if self.response_cache is None:
+            return None
+
+        if not isinstance(image, list):
+            image = [image]
+        return self.response_cache.make_key(model_name, prompt, image, response_schema, system_prompt)
+
+    def is_rate_limited(self) -> bool:
+        # Whether the service caps its own requests per minute, so callers can make more concurrent requests
+        return False
+
+    def batch(self, requests: List[Dict[str, Any]], max_concurrency: int = 1) -> List[dict]:
+        # Each request holds the keyword arguments to __call__.  Services without a native batch endpoint make the requests individually.
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(lambda request: self(**request), requests))
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import List
+
+import PIL
+from pydantic import BaseModel
+
+from marker.services.util import get_json_schema
+
+
+class ResponseCache:
+    """
+    A content-addressed sqlite cache of LLM responses, so repeat runs over the same blocks skip the request.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL)")
+
+    @staticmethod
+    def make_key(
+        model_name: str,
+        prompt: str,
+        images: List[PIL.Image.Image],
+        response_schema: type[BaseModel],
+        system_prompt: str | None = None
+    ) -> str:
+        key = hashlib.sha256()
+        schema = json.dumps(get_json_schema(response_schema), sort_keys=True)
+        for part in (model_name, system_prompt or "", prompt, schema):
+            key.update(part.encode())
+            key.update(b"\0")
+
+        for image in images:
+            key.update(f"{image.mode}{image.size}".encode())
+            key.update(image.tobytes())
+        return key.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        # A broken cache shouldn't fail the conversion, so errors are treated as a miss
+        try:
+            with self.lock:
+                row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            return json.loads(row[0])
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            print(f"Could not read from the response cache: {e}")
+            return None
+
+    def set(self, key: str, response: dict):
+        try:
+            with self.lock, self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO responses (key, response) VALUES (?, ?)", (key, json.dumps(response)))
+        except sqlite3.Error as e:
+            print(f"Could not write to the response cache: {e}")
@@ -1,31 +1,214 @@
+import hashlib
 import json
+import random
+import threading
 import time
+from collections import Counter
 from io import BytesIO
-from typing import List, Annotated
+from typing import List, Annotated, Dict, Any, Optional, Tuple
 
 import PIL
+import httpx
 from google import genai
 from google.genai import types
 from google.genai.errors import APIError
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 from marker.schema.blocks import Block
 from marker.services import BaseService
+from marker.services.rate_limit import RateLimiter
+
+BATCH_COMPLETED_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
+
 
 class BaseGeminiService(BaseService):
     gemini_model_name: Annotated[
         str,
         "The name of the Google model to use for the service."
     ] = "gemini-2.0-flash"
+    batch_poll_interval: Annotated[
+        int,
+        "The initial number of seconds to wait between batch job status checks.  Doubles after each check."
+    ] = 5
+    batch_max_poll_interval: Annotated[
+        int,
+        "The maximum number of seconds to wait between batch job status checks."
+    ] = 60
+    batch_timeout: Annotated[
+        int,
+        "The maximum number of seconds to wait for a batch job to finish."
+    ] = 86400
+    batch_max_bytes: Annotated[
+        int,
+        "The maximum size in bytes of the requests in a single batch job.  Gemini caps inline batch jobs at 20MB, so larger batches are split into several jobs."
+    ] = 18_000_000
+    use_context_cache: Annotated[
+        bool,
+        "Whether to cache system prompts with Gemini context caching, so they aren't resent with every request.  Only prompts over context_cache_min_tokens are cached."
+    ] = False
+    context_cache_min_tokens: Annotated[
+        int,
+        "The minimum number of tokens in a system prompt to cache it.  Gemini rejects caches smaller than the model minimum."
+    ] = 4096
+    context_cache_ttl: Annotated[
+        int,
+        "The number of seconds to keep cached system prompts alive for."
+    ] = 600
+    requests_per_minute: Annotated[
+        int,
+        "The maximum number of requests per minute to make to the model, shared across all threads.  Set to 0 to disable.  Free tier keys are limited to 15 per minute."
+    ] = 0
+    max_validation_retries: Annotated[
+        int,
+        "The number of immediate retries to make when the model returns malformed JSON or JSON that doesn't match the schema."
+    ] = 2
+    max_image_size: Annotated[
+        int,
+        "The maximum width or height of images sent to the model.  Larger images are downscaled.  Gemini bills larger images as multiple 768px tiles."
+    ] = 1536
+    image_quality: Annotated[
+        int,
+        "The JPEG quality to encode images sent to the model with."
+    ] = 85
+
+    def __init__(self, config: Optional[BaseModel | dict] = None):
+        super().__init__(config)
+
+        # Maps system prompt hashes to cache names and expiry times, or None if the prompt is too short to cache
+        self.cached_contents: Dict[str, Tuple[str, float] | None] = {}
+        self.cache_lock = threading.Lock()
+        self.rate_limiter = RateLimiter(self.requests_per_minute)
+
+        # Number of errors seen per exception class, for debugging flaky runs
+        self.error_counts: Counter = Counter()
+        self.error_lock = threading.Lock()
+
+        self.clients: Dict[int, genai.Client] = {}
+        self.client_lock = threading.Lock()
 
     def img_to_bytes(self, img: PIL.Image.Image):
+        # Fewer pixels means fewer image tokens and a smaller upload
+        if max(img.size) > self.max_image_size:
+            scale = self.max_image_size / max(img.size)
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), PIL.Image.Resampling.LANCZOS)
+
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
         image_bytes = BytesIO()
-        img.save(image_bytes, format="WEBP")
+        img.save(image_bytes, format="JPEG", quality=self.image_quality)
         return image_bytes.getvalue()
 
+    def is_rate_limited(self) -> bool:
+        return self.requests_per_minute > 0
+
     def get_google_client(self, timeout: int):
         raise NotImplementedError
 
+    def get_client(self, timeout: int) -> genai.Client:
+        # Reuse one client per timeout, so requests share a connection pool instead of each opening a new connection
+        with self.client_lock:
+            if timeout not in self.clients:
+                self.clients[timeout] = self.get_google_client(timeout=timeout)
+            return self.clients[timeout]
+
+    def get_image_parts(self, image: PIL.Image.Image | List[PIL.Image.Image]):
+        if not isinstance(image, list):
+            image = [image]
+
+        return [types.Part.from_bytes(data=self.img_to_bytes(img), mime_type="image/jpeg") for img in image]
+
+    def get_generation_config(self, response_schema: type[BaseModel], system_prompt: str | None = None, cached_content: str | None = None):
+        config = {
+            "temperature": 0,
+            "response_schema": response_schema,
+            "response_mime_type": "application/json",
+        }
+        if cached_content:
+            config["cached_content"] = cached_content
+        elif system_prompt:
+            config["system_instruction"] = system_prompt
+        return config
+
+    def get_cached_content(self, client: genai.Client, system_prompt: str | None) -> str | None:
+        if not self.use_context_cache or not system_prompt:
+            return None
+
+        prompt_hash = hashlib.sha256(system_prompt.encode()).hexdigest()
+        # Hold the lock while creating, so concurrent requests don't each create a cache
+        with self.cache_lock:
+            if prompt_hash in self.cached_contents:
+                cached_content = self.cached_contents[prompt_hash]
+                if cached_content is None:
+                    return None
+
+                # Recreate the cache before it can expire during a request
+                cache_name, expires_at = cached_content
+                if time.time() + self.timeout < expires_at:
+                    return cache_name
+
+            self.cached_contents[prompt_hash] = None
+            # Every token is at least one character, so shorter prompts can't reach the minimum
+            if len(system_prompt) < self.context_cache_min_tokens:
+                return None
+
+            try:
+                self.rate_limiter.acquire()
+                token_count = client.models.count_tokens(model=self.gemini_model_name, contents=[system_prompt]).total_tokens
+                if token_count < self.context_cache_min_tokens:
+                    return None
+
+                self.rate_limiter.acquire()
+                expires_at = time.time() + self.context_cache_ttl
+                cache = client.caches.create(
+                    model=self.gemini_model_name,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=system_prompt,
+                        ttl=f"{self.context_cache_ttl}s",
+                    )
+                )
+            except Exception as e:
+                print(f"Could not create context cache, sending the full prompt instead: {e}")
+                return None
+
+            self.cached_contents[prompt_hash] = (cache.name, expires_at)
+            return cache.name
+
+    def invalidate_cached_content(self, system_prompt: str):
+        prompt_hash = hashlib.sha256(system_prompt.encode()).hexdigest()
+        with self.cache_lock:
+            self.cached_contents.pop(prompt_hash, None)
+
+    def record_error(self, error: Exception):
+        with self.error_lock:
+            self.error_counts[error.__class__.__name__] += 1
+
+    def print_error_counts(self):
+        with self.error_lock:
+            error_counts = ", ".join(f"{name}: {count}" for name, count in self.error_counts.most_common())
+        print(f"LLM request failed.  Errors so far by type - {error_counts}")
+
+    def wait_for_retry(self, error: Exception, tries: int, max_retries: int):
+        if tries >= max_retries:
+            print(f"{error.__class__.__name__}: {error}. Giving up after {tries} attempts.")
+            return
+
+        # Exponential backoff with jitter, so threads that failed together don't retry together
+        wait_time = min(60, 2 ** tries) + random.random()
+        print(f"{error.__class__.__name__}: {error}. Retrying in {wait_time:.1f} seconds... (Attempt {tries}/{max_retries})")
+        time.sleep(wait_time)
+
+    def parse_response(self, responses: types.GenerateContentResponse, block: Block):
+        output = responses.candidates[0].content.parts[0].text
+        total_tokens = responses.usage_metadata.total_token_count
+        block.update_metadata(llm_tokens_used=total_tokens, llm_request_count=1)
+        return json.loads(output)
+
     def __call__(
             self,
             prompt: str,
@@ -33,7 +216,8 @@ class BaseGeminiService(BaseService):
             block: Block,
             response_schema: type[BaseModel],
             max_retries: int | None = None,
-            timeout: int | None = None
+            timeout: int | None = None,
+            system_prompt: str | None = None
     ):
         if max_retries is None:
             max_retries = self.max_retries
@@ -41,44 +225,202 @@ class BaseGeminiService(BaseService):
         if timeout is None:
             timeout = self.timeout
 
-        if not isinstance(image, list):
-            image = [image]
+        cache_key = self.response_cache_key(self.gemini_model_name, prompt, image, response_schema, system_prompt)
+        if cache_key is not None:
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
 
-        client = self.get_google_client(timeout=timeout)
-        image_parts = [types.Part.from_bytes(data=self.img_to_bytes(img), mime_type="image/webp") for img in image]
+        client = self.get_client(timeout)
+        image_parts = self.get_image_parts(image)
 
+        cache_refreshed = False
         tries = 0
+        validation_tries = 0
         while tries < max_retries:
+            cached_content = self.get_cached_content(client, system_prompt)
+            self.rate_limiter.acquire()
             try:
                 responses = client.models.generate_content(
                     model=self.gemini_model_name,
                     contents=image_parts + [prompt], # According to gemini docs, it performs better if the image is the first element
-                    config={
-                        "temperature": 0,
-                        "response_schema": response_schema,
-                        "response_mime_type": "application/json",
-                    },
+                    config=self.get_generation_config(response_schema, system_prompt, cached_content),
                 )
-                output = responses.candidates[0].content.parts[0].text
-                total_tokens = responses.usage_metadata.total_token_count
-                block.update_metadata(llm_tokens_used=total_tokens, llm_request_count=1)
-                return json.loads(output)
+                output = self.parse_response(responses, block)
+                response_schema.model_validate(output)
+                if cache_key is not None:
+                    self.response_cache.set(cache_key, output)
+                return output
             except APIError as e:
-                if e.code == 429:
-                    # Rate limit exceeded
+                if e.code == 404 and cached_content and not cache_refreshed:
+                    # The cache expired or was deleted, so recreate it
+                    self.invalidate_cached_content(system_prompt)
+                    cache_refreshed = True
+                elif e.code == 429 or e.code >= 500:
+                    # Rate limit exceeded or server error
                     tries += 1
-                    wait_time = tries * 3
-                    print(f"APIError: {e}. Retrying in {wait_time} seconds... (Attempt {tries}/{max_retries})")
-                    time.sleep(wait_time)
+                    self.record_error(e)
+                    self.wait_for_retry(e, tries, max_retries)
                 else:
+                    self.record_error(e)
                     print(e)
                     break
+            except httpx.TransportError as e:
+                # Timeouts and dropped connections
+                tries += 1
+                self.record_error(e)
+                self.wait_for_retry(e, tries, max_retries)
+            except (json.JSONDecodeError, ValidationError) as e:
+                # Malformed output is usually a one-off, so retry right away without sleeping
+                validation_tries += 1
+                self.record_error(e)
+                if validation_tries > self.max_validation_retries:
+                    print(f"Invalid response: {e}")
+                    break
+                print(f"Invalid response: {e}. Retrying... (Attempt {validation_tries}/{self.max_validation_retries})")
             except Exception as e:
+                self.record_error(e)
                 print(e)
                 break
 
+        self.print_error_counts()
         return {}
 
+    def batch(self, requests: List[Dict[str, Any]], max_concurrency: int = 1) -> List[dict]:
+        cache_keys = [
+            self.response_cache_key(self.gemini_model_name, request["prompt"], request["image"], request["response_schema"], request.get("system_prompt"))
+            for request in requests
+        ]
+        outputs = [self.response_cache.get(key) if key is not None else None for key in cache_keys]
+
+        # Only submit the requests that aren't cached
+        pending_idxs = [i for i, output in enumerate(outputs) if output is None]
+        responses = self.submit_batch([requests[i] for i in pending_idxs], max_concurrency)
+        for i, response in zip(pending_idxs, responses):
+            outputs[i] = response
+            if response and cache_keys[i] is not None:
+                self.response_cache.set(cache_keys[i], response)
+        return outputs
+
+    def submit_batch(self, requests: List[Dict[str, Any]], max_concurrency: int = 1) -> List[dict]:
+        """
+        Submit the requests as Gemini batch jobs, wait for them to finish, then map the responses back.
+        Batch jobs are billed at a discount, but can take much longer to complete than individual requests.
+        Requests the batch jobs don't answer are retried individually, max_concurrency at a time.
+        """
+        if not requests:
+            return []
+
+        client = self.get_client(self.timeout)
+        inlined_requests = [self.get_inlined_request(request) for request in requests]
+        request_sizes = [self.get_request_size(inlined_request["contents"][0].parts) for inlined_request in inlined_requests]
+
+        # Create every job before waiting on any, so they run at the same time
+        chunks = self.chunk_requests(request_sizes)
+        batch_jobs = []
+        for chunk in chunks:
+            try:
+                self.rate_limiter.acquire()
+                batch_jobs.append(client.batches.create(
+                    model=self.gemini_model_name,
+                    src=[inlined_requests[i] for i in chunk],
+                    config={"display_name": "marker"},
+                ))
+            except Exception as e:
+                print(f"Could not create batch job: {e}")
+                batch_jobs.append(None)
+
+        outputs = [{} for _ in requests]
+        for chunk, batch_job in zip(chunks, batch_jobs):
+            if batch_job is None:
+                continue
+
+            batch_job = self.wait_for_batch(client, batch_job)
+            if batch_job is None:
+                continue
+
+            # Inlined responses come back in the same order as the requests
+            for i, inlined_response in zip(chunk, batch_job.dest.inlined_responses):
+                if inlined_response.error or inlined_response.response is None:
+                    print(f"Batch request failed: {inlined_response.error}")
+                    continue
+
+                try:
+                    output = self.parse_response(inlined_response.response, requests[i]["block"])
+                    # Invalid output is retried individually, so it goes through the same validation budget as realtime requests
+                    requests[i]["response_schema"].model_validate(output)
+                    outputs[i] = output
+                except Exception as e:
+                    self.record_error(e)
+                    print(f"Invalid batch response: {e}")
+
+        failed_idxs = [i for i, output in enumerate(outputs) if not output]
+        if failed_idxs:
+            print(f"Retrying {len(failed_idxs)} batch requests individually.")
+            for i, output in zip(failed_idxs, super().batch([requests[i] for i in failed_idxs], max_concurrency)):
+                outputs[i] = output
+        return outputs
+
+    def get_inlined_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        # The SDK serializes an inlined request's system instruction and cached content outside of the request itself,
+        # so the system prompt goes in the contents instead, ahead of the prompt
+        parts = self.get_image_parts(request["image"])
+        if request.get("system_prompt"):
+            parts.append(types.Part.from_text(text=request["system_prompt"]))
+        parts.append(types.Part.from_text(text=request["prompt"]))
+        return {
+            "contents": [types.Content(role="user", parts=parts)],
+            "config": self.get_generation_config(request["response_schema"]),
+        }
+
+    def get_request_size(self, parts: List[types.Part]) -> int:
+        size = 0
+        for part in parts:
+            if part.inline_data is not None:
+                size += len(part.inline_data.data) * 4 // 3 # Images are sent base64 encoded
+            else:
+                size += len(part.text.encode())
+        return size
+
+    def chunk_requests(self, request_sizes: List[int]) -> List[List[int]]:
+        # Gemini rejects inline batch jobs over a total size, so split the requests into jobs under the limit
+        chunks = []
+        chunk = []
+        chunk_size = 0
+        for i, size in enumerate(request_sizes):
+            if chunk and chunk_size + size > self.batch_max_bytes:
+                chunks.append(chunk)
+                chunk = []
+                chunk_size = 0
+            chunk.append(i)
+            chunk_size += size
+
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def wait_for_batch(self, client: genai.Client, batch_job: types.BatchJob) -> types.BatchJob | None:
+        try:
+            poll_interval = self.batch_poll_interval
+            start_time = time.time()
+            while batch_job.state.name not in BATCH_COMPLETED_STATES:
+                if time.time() - start_time > self.batch_timeout:
+                    print(f"Batch job {batch_job.name} did not finish in {self.batch_timeout} seconds, cancelling.")
+                    client.batches.cancel(name=batch_job.name)
+                    return None
+
+                time.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, self.batch_max_poll_interval)
+                batch_job = client.batches.get(name=batch_job.name)
+        except Exception as e:
+            print(e)
+            return None
+
+        if batch_job.state.name != "JOB_STATE_SUCCEEDED":
+            print(f"Batch job {batch_job.name} finished with state {batch_job.state.name}: {batch_job.error}")
+            return None
+        return batch_job
+
 
 class GoogleGeminiService(BaseGeminiService):
     gemini_api_key: Annotated[
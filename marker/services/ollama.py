@@ -9,6 +9,7 @@ from pydantic import BaseModel
 
 from marker.schema.blocks import Block
 from marker.services import BaseService
+from marker.services.util import get_json_schema
 
 
 class OllamaService(BaseService):
@@ -33,12 +34,19 @@ class OllamaService(BaseService):
         block: Block,
         response_schema: type[BaseModel],
         max_retries: int | None = None,
-        timeout: int | None = None
+        timeout: int | None = None,
+        system_prompt: str | None = None
     ):
+        cache_key = self.response_cache_key(self.ollama_model, prompt, image, response_schema, system_prompt)
+        if cache_key is not None:
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
+
         url = f"{self.ollama_base_url}/api/generate"
         headers = {"Content-Type": "application/json"}
 
-        schema = response_schema.model_json_schema()
+        schema = get_json_schema(response_schema)
         format_schema = {
             "type": "object",
             "properties": schema["properties"],
@@ -57,6 +65,8 @@ class OllamaService(BaseService):
             "format": format_schema,
             "images": image_bytes
         }
+        if system_prompt:
+            payload["system"] = system_prompt
 
         try:
             response = requests.post(url, json=payload, headers=headers)
@@ -66,8 +76,10 @@ class OllamaService(BaseService):
             total_tokens = response_data["prompt_eval_count"] + response_data["eval_count"]
             block.update_metadata(llm_request_count=1, llm_tokens_used=total_tokens)
 
-            data = response_data["response"]
-            return json.loads(data)
+            data = json.loads(response_data["response"])
+            if cache_key is not None:
+                self.response_cache.set(cache_key, data)
+            return data
         except Exception as e:
             print(f"Ollama inference failed: {e}")
 
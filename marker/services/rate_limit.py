@@ -0,0 +1,32 @@
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """
+    A thread-safe sliding window limiter, so every thread sharing a service stays under the provider's requests per minute.
+    """
+    def __init__(self, requests_per_minute: int, window: float = 60):
+        self.requests_per_minute = requests_per_minute
+        self.window = window
+        self.request_times = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # A limit of 0 or less disables rate limiting
+        if self.requests_per_minute <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.request_times and now - self.request_times[0] >= self.window:
+                    self.request_times.popleft()
+
+                if len(self.request_times) < self.requests_per_minute:
+                    self.request_times.append(now)
+                    return
+
+                wait_time = self.window - (now - self.request_times[0])
+            time.sleep(wait_time)
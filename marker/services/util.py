@@ -0,0 +1,9 @@
+from functools import lru_cache
+
+from pydantic import BaseModel
+
+
+@lru_cache(maxsize=None)
+def get_json_schema(response_schema: type[BaseModel]) -> dict:
+    # Schema classes are shared module-level constants, so generate each JSON schema once.  Callers must not mutate it.
+    return response_schema.model_json_schema()
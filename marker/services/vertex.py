@@ -1,7 +1,8 @@
-from typing import Annotated
+from typing import Annotated, List, Dict, Any
 
 from google import genai
 
+from marker.services import BaseService
 from marker.services.gemini import BaseGeminiService
 
 class GoogleVertexService(BaseGeminiService):
@@ -24,4 +25,8 @@ class GoogleVertexService(BaseGeminiService):
             project=self.vertex_project_id,
             location=self.vertex_location,
             http_options={"timeout": timeout * 1000} # Convert to milliseconds
-        )
\ No newline at end of file
+        )
+
+    def batch(self, requests: List[Dict[str, Any]], max_concurrency: int = 1) -> List[dict]:
+        # Vertex batch prediction only reads from GCS or BigQuery, not inline requests
+        return BaseService.batch(self, requests, max_concurrency)
@@ -13,6 +13,7 @@ class Settings(BaseSettings):
     OUTPUT_DIR: str = os.path.join(BASE_DIR, "conversion_results")
     FONT_DIR: str = os.path.join(BASE_DIR, "static", "fonts")
     DEBUG_DATA_FOLDER: str = os.path.join(BASE_DIR, "debug_data")
+    CACHE_DIR: str = os.path.join(BASE_DIR, "cache")
 
     # General
     OUTPUT_ENCODING: str = "utf-8"
@@ -44,4 +44,31 @@ def test_llm_text_processor_texify(pdf_document):
     # Get all inline math lines
     text_lines = pdf_document.contained_blocks((BlockTypes.Line,))
     text_lines = [line for line in text_lines if line.formats and "math" in line.formats]
-    assert len(text_lines) == 3
\ No newline at end of file
+    assert len(text_lines) == 3
+
+def test_llm_text_processor_skip_short_lines():
+    processor = LLMTextProcessor({"min_math_line_chars": 8})
+
+    short_line = Mock()
+    short_line.raw_text.return_value = "see 3 \n"
+    assert processor.skip_math_line(short_line, None)
+
+    short_math_line = Mock()
+    short_math_line.raw_text.return_value = "x = 3\n"
+    assert not processor.skip_math_line(short_math_line, None)
+
+    long_line = Mock()
+    long_line.raw_text.return_value = "with parameters w, the objective\n"
+    assert not processor.skip_math_line(long_line, None)
+
+
+def test_llm_text_processor_batch_blocks():
+    processor = LLMTextProcessor({"math_line_batch_size": 3, "math_line_batch_max_chars": 100})
+
+    # Short lines are batched by line count
+    blocks = [{"page": None, "block": None, "text": "x" * 10} for _ in range(7)]
+    assert [len(batch) for batch in processor.batch_blocks(blocks)] == [3, 3, 1]
+
+    # Long lines are batched by characters, and lines over the limit get their own batch
+    blocks = [{"page": None, "block": None, "text": "x" * length} for length in (60, 30, 20, 150, 10)]
+    assert [len(batch) for batch in processor.batch_blocks(blocks)] == [2, 1, 1, 1]
@@ -13,6 +13,8 @@ from marker.processors.table import TableProcessor
 from marker.renderers.markdown import MarkdownRenderer
 from marker.schema import BlockTypes
 from marker.schema.blocks import ComplexRegion
+from marker.schema.polygon import PolygonBox
+from marker.services.gemini import GoogleGeminiService
 
 
 @pytest.mark.filename("form_1040.pdf")
@@ -103,6 +105,39 @@ def test_llm_table_processor(pdf_document, detection_model, table_rec_model, rec
     assert "Value 1 $x$" in markdown
 
 
+def test_llm_table_processor_nested():
+    nested_html = """
+<table>
+    <tr>
+        <td>Column 1</td>
+        <td><table><tr><td>Nested 1</td><td>Nested 2</td></tr></table></td>
+    </tr>
+    <tr>
+        <td>Value 1</td>
+        <td>Value 2</td>
+    </tr>
+</table>
+    """.strip()
+
+    processor = LLMTableProcessor(Mock(), {"use_llm": True, "gemini_api_key": "test"})
+    block = Mock(polygon=PolygonBox.from_bbox([0, 0, 100, 100]))
+    cells = processor.parse_html_table(nested_html, block, Mock(page_id=0))
+
+    # Nested table cells are folded into the outer cell's text, without leaving empty cells behind
+    assert [cell.text_lines[0] for cell in cells] == ["Column 1", "Nested 1Nested 2", "Value 1", "Value 2"]
+
+
+def test_llm_processor_concurrency():
+    config = {"use_llm": True, "gemini_api_key": "test", "cache_responses": False}
+    processor = LLMTableProcessor(GoogleGeminiService(config), config)
+    assert processor.get_max_concurrency() == 3
+
+    # Services that limit their own request rate can have more requests in flight
+    rate_limited_config = {**config, "requests_per_minute": 14}
+    processor = LLMTableProcessor(GoogleGeminiService(rate_limited_config), rate_limited_config)
+    assert processor.get_max_concurrency() == 8
+
+
 @pytest.mark.filename("A17_FlightPlan.pdf")
 @pytest.mark.config({"page_range": [0]})
 def test_llm_caption_processor_disabled(pdf_document):
@@ -180,4 +215,22 @@ def test_multi_llm_processors(pdf_document):
 
     contained_equations = pdf_document.contained_blocks((BlockTypes.Equation,))
     print([equation.html for equation in contained_equations])
-    assert all(equation.html == description for equation in contained_equations)
\ No newline at end of file
+    assert all(equation.html == description for equation in contained_equations)
+
+@pytest.mark.filename("A17_FlightPlan.pdf")
+@pytest.mark.config({"page_range": [0]})
+def test_llm_processors_batch_mode(pdf_document):
+    description = "This is an image description."
+    mock_cls = Mock()
+    mock_cls.batch.side_effect = lambda requests, max_concurrency: [{"image_description": description} for _ in requests]
+
+    config = {"use_llm": True, "gemini_api_key": "test", "extract_images": False, "batch_mode": True}
+    processor_lst = [LLMImageDescriptionProcessor(config)]
+    processor = LLMSimpleBlockMetaProcessor(processor_lst, mock_cls, config)
+    processor(pdf_document)
+
+    mock_cls.assert_not_called()
+    assert mock_cls.batch.call_count == 1
+
+    contained_pictures = pdf_document.contained_blocks((BlockTypes.Picture, BlockTypes.Figure))
+    assert all(picture.description == description for picture in contained_pictures)
@@ -0,0 +1,21 @@
+from marker.processors.util import text_to_spans
+
+
+def test_text_to_spans():
+    spans = text_to_spans("Training (AT) <a href='#page-9-1'>[23]</a> of <math>f(x, w)</math> is <b>robust</b>\n")
+
+    assert [span["type"] for span in spans] == ["plain", "plain", "plain", "math", "plain", "bold", "plain"]
+    assert spans[1] == {"type": "plain", "content": "[23]", "url": "#page-9-1"}
+    assert spans[3]["content"] == "f(x, w)"
+    assert spans[5]["content"] == "robust"
+
+
+def test_text_to_spans_nested():
+    spans = text_to_spans("<math>\\frac{a}{b}\n<sub>1</sub></math><sup><i>a</i>b</sup> &amp; <i>unclosed")
+
+    # Latex is escaped, nested tags with multiple children are dropped, and unclosed tags are closed at the end
+    assert spans == [
+        {"type": "math", "content": "\\frac{a}{b}\\n1", "url": None},
+        {"type": "plain", "content": " & ", "url": None},
+        {"type": "italic", "content": "unclosed", "url": None},
+    ]
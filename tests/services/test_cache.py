@@ -0,0 +1,38 @@
+from PIL import Image
+from pydantic import BaseModel
+
+from marker.services.cache import ResponseCache
+
+
+class CacheSchema(BaseModel):
+    corrected_markdown: str
+
+
+def test_cache_key_stable():
+    image = Image.new("RGB", (32, 32), color="white")
+    key = ResponseCache.make_key("model", "prompt", [image], CacheSchema, "system")
+
+    assert key == ResponseCache.make_key("model", "prompt", [image.copy()], CacheSchema, "system")
+    assert key != ResponseCache.make_key("model", "other prompt", [image], CacheSchema, "system")
+    assert key != ResponseCache.make_key("model", "prompt", [Image.new("RGB", (32, 32), color="black")], CacheSchema, "system")
+    assert key != ResponseCache.make_key("model", "prompt", [image], CacheSchema)
+
+
+def test_cache_hit_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    key = ResponseCache.make_key("model", "prompt", [], CacheSchema)
+
+    assert cache.get(key) is None
+    cache.set(key, {"corrected_markdown": "test"})
+    assert cache.get(key) == {"corrected_markdown": "test"}
+
+    # Responses persist across connections
+    assert ResponseCache(str(tmp_path / "responses.db")).get(key) == {"corrected_markdown": "test"}
+
+
+def test_cache_errors_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    cache.connection.close()
+
+    assert cache.get("key") is None
+    cache.set("key", {"corrected_markdown": "test"})
@@ -0,0 +1,161 @@
+from types import SimpleNamespace
+
+from google.genai import batches
+from google.genai.errors import ClientError
+from PIL import Image
+from pydantic import BaseModel
+
+from marker.services.gemini import GoogleGeminiService
+
+
+class RetrySchema(BaseModel):
+    corrected_markdown: str
+
+
+def make_service(config=None):
+    return GoogleGeminiService({"gemini_api_key": "test", "cache_responses": False, **(config or {})})
+
+
+def make_response(mocker, text):
+    response = mocker.MagicMock()
+    response.candidates[0].content.parts[0].text = text
+    response.usage_metadata.total_token_count = 10
+    return response
+
+
+def test_gemini_backoff_on_rate_limit(mocker):
+    service = make_service()
+    client = mocker.MagicMock()
+    client.models.generate_content.side_effect = [
+        ClientError(429, {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}}),
+        make_response(mocker, '{"corrected_markdown": "test"}'),
+    ]
+    mocker.patch.object(service, "get_client", return_value=client)
+    sleep = mocker.patch("marker.services.gemini.time.sleep")
+
+    output = service("prompt", [], mocker.MagicMock(), RetrySchema, max_retries=3)
+    assert output == {"corrected_markdown": "test"}
+    assert sleep.call_count == 1
+    assert service.error_counts["ClientError"] == 1
+
+
+def test_gemini_fast_retry_on_invalid_output(mocker):
+    service = make_service()
+    client = mocker.MagicMock()
+    client.models.generate_content.side_effect = [
+        make_response(mocker, "not json"),
+        make_response(mocker, '{"wrong_key": "test"}'),
+        make_response(mocker, '{"corrected_markdown": "test"}'),
+    ]
+    mocker.patch.object(service, "get_client", return_value=client)
+    sleep = mocker.patch("marker.services.gemini.time.sleep")
+
+    # Malformed output is retried right away, without using up the backoff budget
+    output = service("prompt", [], mocker.MagicMock(), RetrySchema, max_retries=1)
+    assert output == {"corrected_markdown": "test"}
+    assert sleep.call_count == 0
+    assert service.error_counts["JSONDecodeError"] == 1
+    assert service.error_counts["ValidationError"] == 1
+
+
+def test_gemini_invalid_output_budget(mocker):
+    service = make_service({"max_validation_retries": 2})
+    client = mocker.MagicMock()
+    client.models.generate_content.return_value = make_response(mocker, "not json")
+    mocker.patch.object(service, "get_client", return_value=client)
+    sleep = mocker.patch("marker.services.gemini.time.sleep")
+
+    output = service("prompt", [], mocker.MagicMock(), RetrySchema, max_retries=3)
+    assert output == {}
+    assert client.models.generate_content.call_count == 3
+    assert sleep.call_count == 0
+
+
+def test_gemini_context_cache_refresh(mocker):
+    service = make_service({"use_context_cache": True, "context_cache_min_tokens": 10, "context_cache_ttl": 600})
+    client = mocker.MagicMock()
+    client.models.count_tokens.return_value.total_tokens = 100
+    client.caches.create.side_effect = [SimpleNamespace(name="cachedContents/1"), SimpleNamespace(name="cachedContents/2")]
+    now = mocker.patch("marker.services.gemini.time.time", return_value=0)
+
+    system_prompt = "system prompt " * 10
+    assert service.get_cached_content(client, system_prompt) == "cachedContents/1"
+    now.return_value = 100
+    assert service.get_cached_content(client, system_prompt) == "cachedContents/1"
+
+    # The cache is recreated before it expires
+    now.return_value = 590
+    assert service.get_cached_content(client, system_prompt) == "cachedContents/2"
+    assert client.caches.create.call_count == 2
+
+    # Prompts too short to cache skip the token count request
+    assert service.get_cached_content(client, "short") is None
+    assert client.models.count_tokens.call_count == 2
+
+
+def test_gemini_batch_chunks():
+    service = make_service({"batch_max_bytes": 10})
+    assert service.chunk_requests([4, 4, 4, 20, 1]) == [[0, 1], [2], [3], [4]]
+
+
+def test_gemini_batch_fallback(mocker):
+    service = make_service()
+    client = mocker.MagicMock()
+    client.batches.create.side_effect = Exception("Batch too large")
+    mocker.patch.object(service, "get_client", return_value=client)
+    call = mocker.patch.object(GoogleGeminiService, "__call__", return_value={"corrected_markdown": "test"})
+
+    requests = [
+        {"prompt": f"prompt {i}", "image": Image.new("RGB", (32, 32)), "block": None, "response_schema": None}
+        for i in range(3)
+    ]
+    outputs = service.submit_batch(requests)
+
+    # A failed job shouldn't empty the document, the requests are made one at a time instead
+    assert outputs == [{"corrected_markdown": "test"}] * 3
+    assert call.call_count == 3
+
+
+def test_gemini_batch_system_prompt():
+    service = make_service()
+    inlined_request = service.get_inlined_request({
+        "prompt": "prompt",
+        "image": [],
+        "block": None,
+        "response_schema": RetrySchema,
+        "system_prompt": "system prompt",
+    })
+
+    # Everything needs to serialize under the request, or the batch API drops or rejects it
+    serialized = batches._InlinedRequest_to_mldev(service.get_client(service.timeout)._api_client, inlined_request)
+    assert list(serialized.keys()) == ["request"]
+    assert [part["text"] for part in serialized["request"]["contents"][0]["parts"]] == ["system prompt", "prompt"]
+
+
+def test_gemini_batch_responses(mocker):
+    service = make_service({"batch_max_bytes": 25})
+    client = mocker.MagicMock()
+    client.batches.create.side_effect = [
+        SimpleNamespace(name="batches/1", state=SimpleNamespace(name="JOB_STATE_SUCCEEDED"), dest=SimpleNamespace(inlined_responses=[
+            SimpleNamespace(error=None, response=make_response(mocker, '{"corrected_markdown": "0"}')),
+            SimpleNamespace(error="Internal error", response=None),
+        ])),
+        SimpleNamespace(name="batches/2", state=SimpleNamespace(name="JOB_STATE_SUCCEEDED"), dest=SimpleNamespace(inlined_responses=[
+            SimpleNamespace(error=None, response=make_response(mocker, '{"corrected_markdown": "2"}')),
+            SimpleNamespace(error=None, response=make_response(mocker, '{"wrong_key": "3"}')),
+        ])),
+    ]
+    mocker.patch.object(service, "get_client", return_value=client)
+    call = mocker.patch.object(GoogleGeminiService, "__call__", side_effect=lambda prompt, **kwargs: {"corrected_markdown": prompt[-1]})
+
+    requests = [
+        {"prompt": f"prompt {i:03d}", "image": [], "block": mocker.MagicMock(), "response_schema": RetrySchema}
+        for i in range(4)
+    ]
+    outputs = service.submit_batch(requests)
+
+    # Responses map back to requests by position across jobs, and failed or invalid requests are retried on their own
+    assert client.batches.create.call_count == 2
+    assert outputs == [{"corrected_markdown": str(i)} for i in range(4)]
+    assert call.call_count == 2
+    assert service.error_counts["ValidationError"] == 1
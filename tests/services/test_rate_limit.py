@@ -0,0 +1,24 @@
+import time
+
+from marker.services.rate_limit import RateLimiter
+
+
+def test_rate_limiter_waits_for_window():
+    limiter = RateLimiter(2, window=0.5)
+
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.acquire()
+
+    # The third request has to wait for the first to leave the window
+    assert time.monotonic() - start >= 0.5
+
+
+def test_rate_limiter_disabled():
+    limiter = RateLimiter(0)
+
+    start = time.monotonic()
+    for _ in range(100):
+        limiter.acquire()
+
+    assert time.monotonic() - start < 0.5
@@ -1,6 +1,9 @@
+import threading
+
 import pytest
 
 from marker.converters.pdf import PdfConverter
+from marker.services import BaseService
 from marker.services.gemini import GoogleGeminiService
 from marker.services.ollama import OllamaService
 from marker.services.vertex import GoogleVertexService
@@ -38,4 +41,18 @@ def test_llm_vertex(pdf_converter: PdfConverter, temp_pdf):
 @pytest.mark.config({"page_range": [0], "use_llm": True, "llm_service": "marker.services.ollama.OllamaService"})
 def test_llm_ollama(pdf_converter: PdfConverter, temp_pdf):
     assert pdf_converter.artifact_dict["llm_service"] is not None
-    assert isinstance(pdf_converter.llm_service, OllamaService)
\ No newline at end of file
+    assert isinstance(pdf_converter.llm_service, OllamaService)
+
+
+def test_service_batch_fallback():
+    barrier = threading.Barrier(2, timeout=5)
+
+    class ConcurrentService(BaseService):
+        def __call__(self, prompt, image, block, response_schema, max_retries=None, timeout=None, system_prompt=None):
+            # Only passes if two requests are in flight at once
+            barrier.wait()
+            return {"prompt": prompt}
+
+    requests = [{"prompt": f"prompt {i}", "image": None, "block": None, "response_schema": None} for i in range(4)]
+    outputs = ConcurrentService().batch(requests, max_concurrency=2)
+    assert outputs == [{"prompt": f"prompt {i}"} for i in range(4)]